@@ -3,11 +3,14 @@ import os
 
 class Config:
     # Azure OpenAI Configuration
-    AZURE_OPENAI_API_ENDPOINT = os.getenv("AZURE_OPENAI_API_ENDPOINT").strip()
-    AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY").strip()
-    AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-01-preview").strip()
-    AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME").strip()
-    AZURE_MAPS_KEY = os.getenv("AZURE_MAPS_KEY").strip()
+    AZURE_OPENAI_API_ENDPOINT = (os.getenv("AZURE_OPENAI_API_ENDPOINT") or "").strip()
+    AZURE_OPENAI_API_KEY = (os.getenv("AZURE_OPENAI_API_KEY") or "").strip()
+    AZURE_OPENAI_API_VERSION = (os.getenv("AZURE_OPENAI_API_VERSION") or "2024-10-01-preview").strip()
+    AZURE_OPENAI_DEPLOYMENT_NAME = (os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") or "").strip()
+    AZURE_MAPS_KEY = (os.getenv("AZURE_MAPS_KEY") or "").strip()
+
+    # Maximum number of Azure OpenAI requests kept in flight at once
+    MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY") or 16)
 
     @classmethod
     def validate(cls):
@@ -29,4 +32,8 @@ class Config:
             raise EnvironmentError(
                 f"The following environment variables are missing: {', '.join(missing_configs)}. "
                 "Please check your environment variables and set them accordingly."
-            )
\ No newline at end of file
+            )
+
+
+# Fail fast on misconfiguration when the config is first imported
+Config.validate()
\ No newline at end of file
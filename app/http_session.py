@@ -0,0 +1,36 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def make_session(pool_size: int = 32) -> requests.Session:
+    """
+    Build a requests.Session that keeps connections alive between calls and
+    backs off on throttling and transient server errors.
+
+    Once retries run out the last response is returned rather than a
+    RetryError raised, so callers' raise_for_status() still raises HTTPError.
+
+    Args:
+        pool_size: Keep-alive connections held open per host.
+
+    Returns:
+        A session with the retrying adapter mounted for http and https.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
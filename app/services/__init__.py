@@ -1,5 +1,6 @@
-from app.services.azure.azure_openai_service import AzureOpenaiService
+from app.services.azure.azure_openai_service import AzureOpenaiService, get_azure_openai_service
 
 __all__ = [
-    "AzureOpenaiService"
+    "AzureOpenaiService",
+    "get_azure_openai_service"
 ]
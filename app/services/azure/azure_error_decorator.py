@@ -1,11 +1,25 @@
+import inspect
 from functools import wraps
 
 def handle_azure_errors(func):
     """
     A decorator to catch and handle exceptions related to Azure OpenAI errors.
+    Works for both regular and async functions.
     :param func: The function to wrap.
     :return: The wrapped function with error handling.
     """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                # Await the decorated coroutine
+                return await func(*args, **kwargs)
+            except Exception as e:
+                # Handle Azure/OpenAI-specific errors or other exceptions
+                return f"Error querying Azure OpenAI: {str(e)}"
+
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         try:
@@ -15,4 +29,4 @@ def handle_azure_errors(func):
             # Handle Azure/OpenAI-specific errors or other exceptions
             return f"Error querying Azure OpenAI: {str(e)}"
 
-    return wrapper
+    return wrapper
\ No newline at end of file
@@ -1,11 +1,64 @@
+import io
 import os
-from openai import AzureOpenAI
+import json
+import time
+import asyncio
+import logging
+import itertools
+from email.utils import parsedate_to_datetime
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from openai.types.chat import ChatCompletion
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 import openai
 
 from app.config import Config
 from app.services.azure.azure_error_decorator import handle_azure_errors
+from app.services.azure import llm_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds to hold off an endpoint whose rate-limit headers report no remaining quota
+RATE_LIMIT_WINDOW_SECONDS = 10
+
+# Keep-alive connections held open by the shared HTTP client
+HTTP_POOL_SIZE = 32
+
+# Errors worth retrying with backoff; anything else (bad request, auth,
+# content filter) fails immediately instead of burning retries
+TRANSIENT_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def _retry_after_seconds(headers) -> float:
+    """
+    Reads how long the server asked us to back off, from retry-after-ms or
+    Retry-After (either delta-seconds or an HTTP date).
+
+    :param headers: Response headers
+    :return: Seconds to wait; RATE_LIMIT_WINDOW_SECONDS if the headers are unreadable
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            pass
+
+    return RATE_LIMIT_WINDOW_SECONDS
+
 
 class AzureOpenaiService:
     def __init__(self):
@@ -20,46 +73,347 @@ class AzureOpenaiService:
             },
             {
                 "api_key": os.getenv("AZURE_OPENAI_API_KEY_0"),
-                "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+                "api_version": Config.AZURE_OPENAI_API_VERSION,
                 "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT_0")
             },
             {
                 "api_key": os.getenv("AZURE_OPENAI_API_KEY_1"),
-                "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+                "api_version": Config.AZURE_OPENAI_API_VERSION,
                 "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT_1")
             }
         ]
         self.deployment_name = getattr(Config, "AZURE_OPENAI_DEPLOYMENT_NAME", os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"))
 
+        # Only fully configured endpoints are used; client indices below line
+        # up with this list. The fallbacks share Config's API version, which has
+        # a default, so they work without AZURE_OPENAI_API_VERSION being set.
+        self.active_endpoints = [
+            endpoint for endpoint in self.endpoints
+            if endpoint["api_key"] and endpoint["azure_endpoint"] and endpoint["api_version"]
+        ]
+
+        # Build one client per configured endpoint up front, all sharing a single
+        # keep-alive connection pool, instead of re-opening HTTPS on every query.
+        self.http_client = openai.DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+        )
+        self.clients = [
+            AzureOpenAI(
+                api_key=endpoint["api_key"],
+                api_version=endpoint["api_version"],
+                azure_endpoint=endpoint["azure_endpoint"],
+                http_client=self.http_client
+            )
+            for endpoint in self.active_endpoints
+        ]
+
+        # Async clients are bound to the event loop that opened their pool, so
+        # they are built per running loop by _async_clients rather than here
+        self._async_sessions = {}  # event loop -> {"users", "http_client", "clients"}
+
+        # Remaining quota per endpoint, as last reported by x-ratelimit-* headers
+        self.rate_limits = [
+            {"remaining_requests": None, "remaining_tokens": None, "reset_at": 0.0}
+            for _ in self.clients
+        ]
+
+        # Rotate the starting endpoint so load (and quota use) is spread evenly
+        self._rotation = itertools.cycle(range(len(self.clients)))
+
+    @asynccontextmanager
+    async def _async_clients(self):
+        """
+        Yields one AsyncAzureOpenAI client per endpoint, bound to the running event
+        loop. Nested uses on the same loop (aquery inside aquery_many) share one
+        keep-alive pool, which is closed when the outermost use exits so no pooled
+        connection outlives its loop.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None:
+            # Sized so every concurrent aquery_many request can hold a connection
+            pool_size = max(HTTP_POOL_SIZE, Config.MAX_CONCURRENCY)
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            session = {
+                "users": 0,
+                "http_client": http_client,
+                "clients": [
+                    AsyncAzureOpenAI(
+                        api_key=endpoint["api_key"],
+                        api_version=endpoint["api_version"],
+                        azure_endpoint=endpoint["azure_endpoint"],
+                        http_client=http_client
+                    )
+                    for endpoint in self.active_endpoints
+                ],
+            }
+            self._async_sessions[loop] = session
+
+        session["users"] += 1
+        try:
+            yield session["clients"]
+        finally:
+            session["users"] -= 1
+            if session["users"] == 0:
+                del self._async_sessions[loop]
+                await session["http_client"].aclose()
+
+    def _endpoint_order(self) -> list[int]:
+        """
+        Returns endpoint indices in the order they should be tried: round-robin
+        from the next endpoint, with endpoints that are out of quota moved last.
+
+        :return: List of endpoint client indices
+        """
+        start = next(self._rotation)
+        order = [(start + offset) % len(self.clients) for offset in range(len(self.clients))]
+        return sorted(order, key=self._rate_limit_delay)
+
+    def _rate_limit_delay(self, index: int) -> float:
+        """
+        Returns how long to wait before sending to an endpoint with no quota left.
+
+        :param index: Index of the endpoint client
+        :return: Seconds to wait, 0 if the endpoint has quota
+        """
+        state = self.rate_limits[index]
+        if state["remaining_requests"] == 0 or state["remaining_tokens"] == 0:
+            return max(state["reset_at"] - time.time(), 0.0)
+        return 0.0
+
+    def _record_rate_limit(self, index: int, headers) -> None:
+        """
+        Updates an endpoint's quota from the rate-limit headers of a response.
+
+        :param index: Index of the endpoint client
+        :param headers: Response headers
+        """
+        state = self.rate_limits[index]
+        for header, key in (
+            ("x-ratelimit-remaining-requests", "remaining_requests"),
+            ("x-ratelimit-remaining-tokens", "remaining_tokens")
+        ):
+            value = headers.get(header)
+            if value is not None:
+                try:
+                    state[key] = int(value)
+                except ValueError:
+                    pass
+
+        if "retry-after" in headers or "retry-after-ms" in headers:
+            # Throttled: honour the server's Retry-After
+            state["remaining_requests"] = 0
+            state["reset_at"] = time.time() + _retry_after_seconds(headers)
+        elif state["remaining_requests"] == 0 or state["remaining_tokens"] == 0:
+            state["reset_at"] = time.time() + RATE_LIMIT_WINDOW_SECONDS
+
     @handle_azure_errors
     @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((openai.RateLimitError, openai.APIError))
+        stop=stop_after_attempt(5),
+        wait=wait_random_exponential(multiplier=1, max=30),
+        retry=retry_if_exception_type(TRANSIENT_ERRORS)
     )
-    def query(self, messages: list[dict]) -> str:
+    def query(self, messages: list[dict], response_format: dict | None = None, use_cache: bool = True) -> str:
         """
-        Sends a list of messages to Azure OpenAI with retry and fallback.
+        Sends a list of messages to Azure OpenAI with retry and fallback,
+        spreading requests over the configured endpoints round-robin.
+        Responses are cached on disk, so identical requests are only sent once.
 
         :param messages: List of message dicts [{"role": "user", "content": "..."}]
+        :param response_format: Optional response format, e.g. {"type": "json_object"}
+        :param use_cache: Whether to read and write the on-disk response cache
         :return: Model response content
         """
+        cache_key = llm_cache.make_key(messages, self.deployment_name, response_format)
+        if use_cache:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         last_exception = None
 
-        for endpoint in self.endpoints:
+        for index in self._endpoint_order():
+            client = self.clients[index]
             try:
-                client = AzureOpenAI(
-                    api_key=endpoint["api_key"],
-                    api_version=endpoint["api_version"],
-                    azure_endpoint=endpoint["azure_endpoint"]
-                )
-                response: ChatCompletion = client.chat.completions.create(
+                time.sleep(self._rate_limit_delay(index))
+                raw_response = client.chat.completions.with_raw_response.create(
                     model=self.deployment_name,
                     messages=messages,
+                    response_format=response_format or openai.NOT_GIVEN,
                 )
-                return response.choices[0].message.content.strip()
+                response: ChatCompletion = raw_response.parse()
+                content = response.choices[0].message.content.strip()
+            except openai.RateLimitError as e:
+                self._record_rate_limit(index, e.response.headers)
+                last_exception = e
+                continue
             except Exception as e:
                 last_exception = e
                 continue
 
-        raise last_exception
\ No newline at end of file
+            # Recorded outside the try, so odd headers can't discard a good completion
+            self._record_rate_limit(index, raw_response.headers)
+            if use_cache:
+                llm_cache.put(cache_key, content)
+            return content
+
+        raise last_exception
+
+    @handle_azure_errors
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_random_exponential(multiplier=1, max=30),
+        retry=retry_if_exception_type(TRANSIENT_ERRORS)
+    )
+    async def aquery(self, messages: list[dict], response_format: dict | None = None, use_cache: bool = True) -> str:
+        """
+        Async counterpart of query, so many requests can be in flight at once
+        from a single event loop.
+
+        :param messages: List of message dicts [{"role": "user", "content": "..."}]
+        :param response_format: Optional response format, e.g. {"type": "json_object"}
+        :param use_cache: Whether to read and write the on-disk response cache
+        :return: Model response content
+        """
+        cache_key = llm_cache.make_key(messages, self.deployment_name, response_format)
+        if use_cache:
+            # The cache does blocking disk I/O, so it is read off the event loop
+            cached = await asyncio.to_thread(llm_cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        last_exception = None
+
+        async with self._async_clients() as clients:
+            for index in self._endpoint_order():
+                client = clients[index]
+                try:
+                    await asyncio.sleep(self._rate_limit_delay(index))
+                    raw_response = await client.chat.completions.with_raw_response.create(
+                        model=self.deployment_name,
+                        messages=messages,
+                        response_format=response_format or openai.NOT_GIVEN,
+                    )
+                    response: ChatCompletion = raw_response.parse()
+                    content = response.choices[0].message.content.strip()
+                except openai.RateLimitError as e:
+                    self._record_rate_limit(index, e.response.headers)
+                    last_exception = e
+                    continue
+                except Exception as e:
+                    last_exception = e
+                    continue
+
+                # Recorded outside the try, so odd headers can't discard a good completion
+                self._record_rate_limit(index, raw_response.headers)
+                if use_cache:
+                    await asyncio.to_thread(llm_cache.put, cache_key, content)
+                return content
+
+        raise last_exception
+
+    async def aquery_many(self, messages_list: list[list[dict]], response_format: dict | None = None) -> list[str]:
+        """
+        Runs many queries concurrently, with at most Config.MAX_CONCURRENCY in flight.
+        Identical requests are only sent once and their response is shared.
+
+        :param messages_list: One list of message dicts per request
+        :param response_format: Optional response format applied to every request
+        :return: Model response contents, in the same order as messages_list
+        """
+        semaphore = asyncio.Semaphore(Config.MAX_CONCURRENCY)
+
+        async def bounded_query(messages: list[dict]) -> str:
+            async with semaphore:
+                return await self.aquery(messages, response_format=response_format)
+
+        keys = [llm_cache.make_key(messages, self.deployment_name, response_format) for messages in messages_list]
+        unique = dict(zip(keys, messages_list))
+        # One pool for the whole batch, opened and closed on this event loop
+        async with self._async_clients():
+            responses = await asyncio.gather(*(bounded_query(messages) for messages in unique.values()))
+        by_key = dict(zip(unique.keys(), responses))
+        return [by_key[key] for key in keys]
+
+    def submit_batch(self, requests: dict[str, list[dict]]) -> str:
+        """
+        Uploads chat requests as a single Azure OpenAI batch job. Batch jobs are
+        billed at a discount and are not subject to the per-minute rate limits.
+
+        :param requests: Mapping of custom_id -> list of message dicts
+        :return: ID of the created batch job
+        """
+        # Stream compact JSONL straight into memory; whitespace-free separators
+        # keep the upload (and Azure's validation pass over it) small.
+        payload = io.BytesIO()
+        for custom_id, messages in requests.items():
+            line = json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/chat/completions",
+                "body": {"model": self.deployment_name, "messages": messages}
+            }, separators=(",", ":"))
+            payload.write(line.encode("utf-8") + b"\n")
+
+        # Batch jobs and their files live on one endpoint, so always use the primary
+        client = self.clients[0]
+        batch_file = client.files.create(
+            file=("batch.jsonl", payload.getvalue()),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def get_batch_results(self, batch_id: str, poll_interval: float = 30) -> dict[str, str]:
+        """
+        Waits for a batch job to finish and returns its responses.
+
+        :param batch_id: ID returned by submit_batch
+        :param poll_interval: Seconds to wait between status checks
+        :return: Mapping of custom_id -> model response content; failed requests are
+            omitted and their custom_ids logged
+        """
+        client = self.clients[0]
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch_id)
+
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch_id} finished with status '{batch.status}'")
+
+        results = {}
+        failed = []
+        # A batch in which every request failed has no output file, and failures
+        # are written to a separate error file, so either may be missing
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                record = json.loads(line)
+                response = record.get("response")
+                if not response or response.get("status_code") != 200:
+                    failed.append(record["custom_id"])
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[record["custom_id"]] = content.strip()
+
+        if failed:
+            logger.warning("Batch %s: %d request(s) failed: %s", batch_id, len(failed), ", ".join(failed))
+        return results
+
+
+@lru_cache(maxsize=1)
+def get_azure_openai_service() -> AzureOpenaiService:
+    """
+    Returns the process-wide AzureOpenaiService so callers share its clients.
+
+    :return: Shared AzureOpenaiService instance
+    """
+    return AzureOpenaiService()
@@ -0,0 +1,46 @@
+import os
+import json
+from typing import Optional
+
+from app.services.disk_cache import DiskCache, hash_key
+
+LLM_CACHE_DIR = "cache"
+LLM_CACHE_FILE = os.path.join(LLM_CACHE_DIR, "llm_cache.sqlite3")
+
+# Responses cached by earlier versions in a shelve store are imported on first use
+_LEGACY_CACHE_FILE = os.path.join(LLM_CACHE_DIR, "llm_cache")
+
+_cache = DiskCache(LLM_CACHE_FILE, legacy_path=_LEGACY_CACHE_FILE)
+
+
+def make_key(messages: list[dict], model: str, response_format: Optional[dict] = None) -> str:
+    """
+    Builds a stable cache key for a chat request.
+
+    :param messages: List of message dicts sent to the model.
+    :param model: Deployment name the messages are sent to.
+    :param response_format: Response format requested from the model, if any.
+    :return: Hex digest identifying the request.
+    """
+    payload = json.dumps([messages, response_format], sort_keys=True) + model
+    return hash_key(payload)
+
+
+def get(key: str) -> Optional[str]:
+    """
+    Returns the cached response for a key, or None on a miss.
+
+    :param key: Key produced by make_key.
+    :return: Cached model response or None.
+    """
+    return _cache.get(key)
+
+
+def put(key: str, value: str) -> None:
+    """
+    Stores a model response under a key.
+
+    :param key: Key produced by make_key.
+    :param value: Model response content.
+    """
+    _cache.put(key, value)
@@ -1,8 +1,12 @@
 # File: bing_search.py
 import os
-import requests
+import asyncio
+import httpx
 from dotenv import load_dotenv
 
+from app.http_session import make_session
+from app.services.disk_cache import DiskCache, hash_key
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -10,17 +14,31 @@ load_dotenv()
 BING_API_ENDPOINT = os.getenv("BING_API_ENDPOINT")
 BING_API_KEY = os.getenv("BING_API_KEY")
 
+# Shared connection pool so repeated searches reuse keep-alive connections
+_session = make_session()
 
-def search_bing(query: str, domain: str = None) -> dict:
+# Persistent cache of search results, so re-runs don't re-query Bing. Results
+# cached by earlier versions in a shelve store are imported on first use.
+BING_CACHE_FILE = os.path.join("cache", "bing_cache.sqlite3")
+BING_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days
+_cache = DiskCache(
+    BING_CACHE_FILE,
+    ttl=BING_CACHE_TTL,
+    legacy_path=os.path.join("cache", "bing_cache"),
+    convert_legacy=lambda entry: (entry["results"], entry["fetched_at"])
+)
+
+
+def _cache_key(query: str, domain: str = None) -> str:
+    """
+    Hash a query and domain filter into a cache key.
     """
-    Query the Bing Search API and return JSON results.
+    return hash_key(f"{query}|{domain}")
 
-    Args:
-        query: Search query string.
-        domain: Optional domain filter (e.g., "@example.com" or "example.com").
 
-    Returns:
-        Parsed JSON response from the Bing Search API.
+def _build_request(query: str, domain: str = None) -> tuple:
+    """
+    Build the URL, query parameters and headers for a Bing search.
     """
     # Construct the base URL
     url = BING_API_ENDPOINT
@@ -40,11 +58,66 @@ def search_bing(query: str, domain: str = None) -> dict:
     headers = {
         "Ocp-Apim-Subscription-Key": BING_API_KEY
     }
+    return url, params, headers
+
+
+def search_bing(query: str, domain: str = None) -> dict:
+    """
+    Query the Bing Search API and return JSON results. Results are cached on
+    disk for BING_CACHE_TTL seconds.
+
+    Args:
+        query: Search query string.
+        domain: Optional domain filter (e.g., "@example.com" or "example.com").
+
+    Returns:
+        Parsed JSON response from the Bing Search API.
+    """
+    key = _cache_key(query, domain)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    url, params, headers = _build_request(query, domain)
 
     # Perform GET request
-    response = requests.get(url, params=params, headers=headers)
+    response = _session.get(url, params=params, headers=headers)
     # Raise an error for bad status codes
     response.raise_for_status()
 
-    # Return the JSON payload
-    return response.json()
\ No newline at end of file
+    # Cache and return the JSON payload
+    results = response.json()
+    _cache.put(key, results)
+    return results
+
+
+async def search_bing_async(query: str, domain: str = None, client: httpx.AsyncClient = None) -> dict:
+    """
+    Async version of search_bing, for running many searches concurrently.
+
+    Args:
+        query: Search query string.
+        domain: Optional domain filter (e.g., "@example.com" or "example.com").
+        client: Optional httpx.AsyncClient owned by the caller, so a batch of
+            searches run with asyncio.gather can share one connection pool.
+            Without it a client is opened and closed for this call alone.
+
+    Returns:
+        Parsed JSON response from the Bing Search API.
+    """
+    # The cache does blocking disk I/O, so it is read and written off the event loop
+    key = _cache_key(query, domain)
+    cached = await asyncio.to_thread(_cache.get, key)
+    if cached is not None:
+        return cached
+
+    url, params, headers = _build_request(query, domain)
+    if client is None:
+        async with httpx.AsyncClient() as owned_client:
+            response = await owned_client.get(url, params=params, headers=headers)
+    else:
+        response = await client.get(url, params=params, headers=headers)
+    response.raise_for_status()
+    results = response.json()
+    await asyncio.to_thread(_cache.put, key, results)
+    return results
@@ -0,0 +1,104 @@
+import os
+import dbm
+import time
+import shelve
+import sqlite3
+import hashlib
+import threading
+import orjson
+from typing import Any, Callable, Optional, Tuple
+
+
+def hash_key(text: str) -> str:
+    """
+    Hash arbitrary request text into a short, fixed-length cache key.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent key/value cache backed by a single SQLite file.
+
+    The connection is opened once per process, on first use, and shared across
+    threads under a lock. Each write is one committed row, so reads and writes
+    cost the same however large the cache grows. Values must be JSON-serialisable.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, legacy_path: Optional[str] = None,
+                 convert_legacy: Optional[Callable[[Any], Tuple[Any, float]]] = None):
+        """
+        Args:
+            path: SQLite file to store entries in.
+            ttl: Seconds an entry stays valid, or None to keep entries forever.
+            legacy_path: shelve store whose entries are imported the first time an
+                empty cache is opened.
+            convert_legacy: Maps a legacy shelve value to (value, stored_at).
+                Defaults to keeping the value and stamping it with the import time.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.legacy_path = legacy_path
+        self.convert_legacy = convert_legacy or (lambda value: (value, time.time()))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return the shared connection, opening it on first use. Callers hold the lock.
+        """
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL)"
+                )
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self) -> None:
+        """
+        Copy entries from the legacy shelve store into an empty cache.
+        """
+        if not self.legacy_path or not dbm.whichdb(self.legacy_path):
+            return
+        if self._conn.execute("SELECT 1 FROM cache LIMIT 1").fetchone():
+            return
+        rows = []
+        with shelve.open(self.legacy_path, flag="r") as legacy:
+            for key in legacy.keys():
+                value, stored_at = self.convert_legacy(legacy[key])
+                rows.append((key, orjson.dumps(value), stored_at))
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", rows)
+
+    def get(self, key: str) -> Any:
+        """
+        Return the cached value for a key, or None if missing or older than the TTL.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if self.ttl is not None and time.time() - stored_at >= self.ttl:
+            return None
+        return orjson.loads(value)
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store a value under a key, replacing any previous entry.
+        """
+        data = orjson.dumps(value)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, data, time.time())
+                )
@@ -1,14 +1,21 @@
 import os
 import re
 import json
-import requests
+import logging
+import shelve
+import threading
+from collections import defaultdict
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
 
+from app.http_session import make_session
+
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # BrightData proxy configuration
 BRIGHTDATA_ENDPOINT = os.getenv("BRIGHTDATA_ENDPOINT")
 BRIGHTDATA_API_KEY = os.getenv("BRIGHTDATA_API_KEY")  # May be used for API calls if needed
@@ -16,59 +23,56 @@ BRIGHTDATA_USERNAME = os.getenv("BRIGHTDATA_USERNAME")
 BRIGHTDATA_ZONE_NAME = os.getenv("BRIGHTDATA_ZONE_NAME")
 BRIGHTDATA_ZONE_PASSWORD = os.getenv("BRIGHTDATA_ZONE_PASSWORD")
 
-# Global caches
-url_cache: Dict[str, Dict[str, str]] = {}
-html_mapping: Dict[str, str] = {}
-drug_cache: Dict[str, Dict[str, str]] = {}
+# Shared session so repeated scrapes reuse keep-alive connections
+_session = make_session()
 
+# Matches characters that are not allowed in drug cache keys or cache filenames
+_NON_WORD_RE = re.compile(r"[^\w\-]")
 
-def load_caches() -> None:
-    """
-    Load existing caches (URL results, HTML mappings, and drug info) from disk.
-    """
-    global url_cache, html_mapping, drug_cache
-    cache_dir = "cache"
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
+# Global caches, persisted as shelve stores so each entry is written on its own
+url_cache: shelve.Shelf = None
+html_mapping: shelve.Shelf = None
+drug_cache: shelve.Shelf = None
 
-    # Load URL cache
-    url_cache_file = os.path.join(cache_dir, "url_cache.json")
-    if os.path.exists(url_cache_file):
-        with open(url_cache_file, 'r') as f:
-            url_cache = json.load(f)
+# shelve stores are not thread-safe; guard every cache access so pages can be
+# scraped from worker threads
+_cache_lock = threading.RLock()
 
-    # Load HTML mapping cache
-    mapping_file = os.path.join(cache_dir, "html_mapping.json")
-    if os.path.exists(mapping_file):
-        with open(mapping_file, 'r') as f:
-            html_mapping = json.load(f)
 
-    # Load drug cache
-    drug_cache_file = os.path.join(cache_dir, "drug_cache.json")
-    if os.path.exists(drug_cache_file):
-        with open(drug_cache_file, 'r') as f:
-            drug_cache = json.load(f)
+def _open_cache(cache_dir: str, name: str) -> shelve.Shelf:
+    """
+    Open a shelve-backed cache, importing a legacy JSON cache file on first use.
+    """
+    cache = shelve.open(os.path.join(cache_dir, name))
+    legacy_file = os.path.join(cache_dir, f"{name}.json")
+    if not len(cache) and os.path.exists(legacy_file):
+        with open(legacy_file, 'r') as f:
+            cache.update(json.load(f))
+        cache.sync()
+    return cache
 
 
-def save_caches() -> None:
+def load_caches() -> None:
     """
-    Save current caches (URL results, HTML mappings, drug info) to disk.
+    Open the caches (URL results, HTML mappings, and drug info) on disk.
     """
+    global url_cache, html_mapping, drug_cache
     cache_dir = "cache"
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
 
-    # Save URL cache
-    with open(os.path.join(cache_dir, "url_cache.json"), 'w') as f:
-        json.dump(url_cache, f, indent=2)
+    url_cache = _open_cache(cache_dir, "url_cache")
+    html_mapping = _open_cache(cache_dir, "html_mapping")
+    drug_cache = _open_cache(cache_dir, "drug_cache")
 
-    # Save HTML mapping
-    with open(os.path.join(cache_dir, "html_mapping.json"), 'w') as f:
-        json.dump(html_mapping, f, indent=2)
 
-    # Save drug cache
-    with open(os.path.join(cache_dir, "drug_cache.json"), 'w') as f:
-        json.dump(drug_cache, f, indent=2)
+def save_caches() -> None:
+    """
+    Flush pending cache writes (URL results, HTML mappings, drug info) to disk.
+    Only changed entries are written, rather than re-serialising every cache.
+    """
+    url_cache.sync()
+    html_mapping.sync()
+    drug_cache.sync()
 
 
 def get_cached_drug_info(drug_name: str) -> Optional[Dict[str, str]]:
@@ -81,11 +85,12 @@ def get_cached_drug_info(drug_name: str) -> Optional[Dict[str, str]]:
     Returns:
         Cached info dict or None if not found.
     """
-    clean_name = re.sub(r"[^\w\-]", "", drug_name.split()[0].split(",")[0])
-    if clean_name in drug_cache:
-        print(f"[DEBUG] Using cached drug info for: {clean_name}")
-        return drug_cache[clean_name]
-    return None
+    clean_name = _NON_WORD_RE.sub("", drug_name.split()[0].split(",")[0])
+    with _cache_lock:
+        cached = drug_cache.get(clean_name)
+    if cached is not None:
+        logger.debug("Using cached drug info for: %s", clean_name)
+    return cached
 
 
 def get_brightdata_proxies() -> Dict[str, str]:
@@ -140,18 +145,18 @@ def save_to_cache(url: str, overview_html: str, drug_name: str) -> str:
         Filepath where HTML was stored.
     """
     cache_dir = "cache"
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
 
-    filename = re.sub(r'[^\w\-]', '_', url)
+    filename = _NON_WORD_RE.sub('_', url)
     filename = filename[:100]  # Limit length
     filepath = os.path.join(cache_dir, f"{filename}.html")
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(overview_html)
 
-    html_mapping[drug_name] = filepath
-    save_caches()
-    print(f"[DEBUG] Saved overview HTML to {filepath}")
+    with _cache_lock:
+        html_mapping[drug_name] = filepath
+        save_caches()
+    logger.debug("Saved overview HTML to %s", filepath)
     return filepath
 
 
@@ -161,26 +166,34 @@ def _scrape(url: str, target_elements: List[str], drug_name: str,
     Internal helper to perform scraping with optional proxies.
     """
     # Use cached data if available
-    if url in url_cache:
-        print(f"[DEBUG] Using cached content for URL: {url}")
-        return url_cache[url]
+    with _cache_lock:
+        cached = url_cache.get(url)
+    if cached is not None:
+        logger.debug("Using cached content for URL: %s", url)
+        return cached
 
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
     }
     # Perform GET request (with or without proxies)
-    response = requests.get(url, headers=headers, proxies=proxies)
+    response = _session.get(url, headers=headers, proxies=proxies)
     response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(response.text, 'lxml')
     # Save overview section if present
     overview_div = soup.find('div', id='overview')
     if overview_div:
         save_to_cache(url, str(overview_div.prettify()), drug_name)
 
     results: Dict[str, str] = {}
+    # Index every data-testid element in one walk of the tree, rather than
+    # re-scanning the whole document once per target element
+    elements_by_testid: Dict[str, list] = defaultdict(list)
+    for elem in soup.find_all(attrs={"data-testid": True}):
+        elements_by_testid[elem["data-testid"]].append(elem)
+
     for element_id in target_elements:
-        elements = soup.find_all(attrs={"data-testid": element_id})
+        elements = elements_by_testid.get(element_id, [])
         unique_texts = set()
         for elem in elements:
             # Organization tags handled specially
@@ -205,9 +218,10 @@ def _scrape(url: str, target_elements: List[str], drug_name: str,
             results[element_id] = format_results(unique_texts)
 
     # Cache and persist
-    url_cache[url] = results
-    drug_cache[drug_name] = results
-    save_caches()
+    with _cache_lock:
+        url_cache[url] = results
+        drug_cache[drug_name] = results
+        save_caches()
     return results
 
 
@@ -232,13 +246,13 @@ def scrape_and_parse_webpage(url: str, target_elements: List[str], drug_name: st
         # If results empty, treat as failure
         raise ValueError("Empty results, retrying with proxy.")
     except Exception as e:
-        print(f"[DEBUG] Direct scrape failed: {e}")
-        print("[DEBUG] Retrying via BrightData proxy...")
+        logger.debug("Direct scrape failed: %s", e)
+        logger.debug("Retrying via BrightData proxy...")
         proxies = get_brightdata_proxies()
         try:
             return _scrape(url, target_elements, drug_name, proxies=proxies)
         except Exception as err:
-            print(f"[DEBUG] Proxy scrape also failed: {err}")
+            logger.warning("Proxy scrape also failed: %s", err)
             return {}
 
 # Initialize caches on import
@@ -1,12 +1,9 @@
-import json
+import orjson
 import re
 import os
 from collections import defaultdict
-
-# -----------------------------------------------------------------------------
-# Setup: make sure output directory exists
-# -----------------------------------------------------------------------------
-os.makedirs("output", exist_ok=True)
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 # -----------------------------------------------------------------------------
 # Load banned phrases (we’ll skip any lead/collaborator containing these)
@@ -17,7 +14,6 @@ banned_phrases = [
     for p in open(banned_phrases_path).read().splitlines()
     if p.strip()
 ]
-print(f"Banned phrases: {banned_phrases}")
 
 # -----------------------------------------------------------------------------
 # Load business suffixes (true legal suffixes to strip off, like Inc, Ltd, AG)
@@ -28,22 +24,59 @@ business_suffixes = [
     for p in open(business_suffixes_path).read().splitlines()
     if p.strip()
 ]
-print(f"Business suffixes: {business_suffixes}")
 
 # -----------------------------------------------------------------------------
-# Read in the raw company names from your CSV
+# Compile the cleaning patterns once, rather than on every clean_company_name call
 # -----------------------------------------------------------------------------
-company_names = []
-with open("resources/unique_company_names.csv", "r") as f:
-    next(f)  # skip header
-    for line in f:
-        name = line.strip().strip('"')
-        if name:
-            company_names.append(name)
+# One pass drops a '(' … ')' group with everything after it, and any other
+# character that isn't a letter/number/underscore/space. The leftmost match
+# wins, so a paren group is still cut off at the first '(' that closes.
+_STRIP_RE = re.compile(r'\([^)]*\).*$|[^\w\s]')
+_WS_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\S+')
+
+# All banned phrases in one alternation, so each name is scanned once rather
+# than once per phrase (None when the list is empty, which bans nothing)
+_BANNED_RE = re.compile('|'.join(re.escape(p) for p in banned_phrases)) if banned_phrases else None
+
+def has_banned(text):
+    """
+    True if the lowercased text contains any banned phrase.
+    """
+    return _BANNED_RE is not None and _BANNED_RE.search(text.lower()) is not None
+
+# Suffixes indexed by their first word, so stripping is one dict lookup per
+# word of the name however long the suffix list grows. Each list keeps file
+# order, so the first listed suffix that fits wins (as a regex alternation would).
+_SUFFIXES_BY_FIRST_WORD = defaultdict(list)
+for _suffix in business_suffixes:
+    _SUFFIXES_BY_FIRST_WORD[_suffix.split(None, 1)[0]].append(_suffix)
+
+def strip_suffixes(cleaned):
+    """
+    Remove every whole-word occurrence of a known business suffix from an
+    already cleaned (lowercase, punctuation-free) name.
+    """
+    parts = []
+    kept_from = 0  # end of the last suffix removed
+    for word in _WORD_RE.finditer(cleaned):
+        start = word.start()
+        if start < kept_from:
+            continue  # inside a multi-word suffix that was just removed
+        for suffix in _SUFFIXES_BY_FIRST_WORD.get(word.group(), ()):
+            end = start + len(suffix)
+            if cleaned.startswith(suffix, start) and (end == len(cleaned) or cleaned[end].isspace()):
+                parts.append(cleaned[kept_from:start])
+                kept_from = end
+                break
+    parts.append(cleaned[kept_from:])
+    return ''.join(parts)
 
 # -----------------------------------------------------------------------------
 # Cleaning function: returns a single normalized string key for each company
 # -----------------------------------------------------------------------------
+# Cached because the same sponsor names recur across thousands of trials
+@lru_cache(maxsize=200_000)
 def clean_company_name(name):
     """
     Turn a raw company name into a cleaned, lowercase key:
@@ -56,125 +89,146 @@ def clean_company_name(name):
     if not isinstance(name, str):
         return ""
 
-    # 1) Remove parentheses and everything after
-    #    e.g. "Acme Corp (USA) GmbH" → "Acme Corp "
-    name = re.sub(r'\([^)]*\).*$', '', name)
+    # 1+2) Remove parentheses and everything after, and strip punctuation /
+    #      anything that’s not a letter/number/underscore/space
+    #    e.g. "Acme Corp. (USA) GmbH" → "Acme Corp "
+    cleaned = _STRIP_RE.sub('', name)
 
-    # 2) Remove common punctuation characters
-    cleaned = re.sub(r'[\.,;:\-]', '', name)
-
-    # 3) Strip anything that’s not a letter/number/underscore/space
-    cleaned = re.sub(r'[^\w\s]', '', cleaned)
-
-    # 4) Lowercase and trim whitespace
+    # 3) Lowercase and trim whitespace
     cleaned = cleaned.strip().lower()
 
-    # 5) Remove any of the known suffix words
-    #    (case-insensitive thanks to re.IGNORECASE flag)
-    suffix_pattern = r'\b(?:' + '|'.join(re.escape(s) for s in business_suffixes) + r')\b'
-    cleaned = re.sub(suffix_pattern, '', cleaned, flags=re.IGNORECASE).strip()
+    # 4) Remove any of the known suffix words
+    #    (both sides are lowercase already)
+    cleaned = strip_suffixes(cleaned).strip()
 
-    # 6) Collapse any run of spaces down to a single space
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    # 5) Collapse any run of spaces down to a single space
+    cleaned = _WS_RE.sub(' ', cleaned)
 
     return cleaned
 
-# -----------------------------------------------------------------------------
-# Build a temporary map from cleaned key → list of raw names
-# This lets us detect collisions (multiple raw names mapping to same key)
-# -----------------------------------------------------------------------------
-temp_map = defaultdict(list)
-for raw in company_names:
-    key = clean_company_name(raw)
-    if key:  # skip empty keys
-        temp_map[key].append(raw)
-
-# -----------------------------------------------------------------------------
-# Build final mapping of unique cleaned key → single raw name
-# (only keep keys that map to exactly one raw name)
-# -----------------------------------------------------------------------------
-unique_cleaned_map = {
-    key: originals[0]
-    for key, originals in temp_map.items()
-    if len(originals) == 1
-}
-
-# Save that cleaned → raw mapping for reference
-with open("output/cleaned_company_names.json", "w") as f:
-    json.dump(unique_cleaned_map, f, indent=2)
-
-# -----------------------------------------------------------------------------
-# Load your clinical trials data
-# -----------------------------------------------------------------------------
-try:
-    with open("output/all_clinical_trials.json", 'r') as f:
-        trials_data = json.load(f)
-except Exception as e:
-    print(f"Error loading JSON file: {e}")
-    exit(1)
-
-# Prepare containers for matched companies and unknown trials
-known_companies = {}   # cleaned_key → { trial_count, trials: [...] }
-unknown_trials = []    # trials we couldn’t match to any company
-lead_sponsors = set()  # to record unique (lead, collaborators) pairs
-
-# -----------------------------------------------------------------------------
-# Iterate through each trial, try to match lead sponsor or collaborators
-# -----------------------------------------------------------------------------
-for trial in trials_data:
-    lead_raw = trial.get("Lead Sponsor", "").strip()
-    collab_list = [
-        c.strip() for c in trial.get("Collaborators", "").split(",") if c.strip()
-    ]
-
-    # Skip trial entirely if lead contains a banned phrase
-    if any(bp in lead_raw.lower() for bp in banned_phrases):
-        continue
-
-    matched = set()
-
-    # --- Attempt to match the lead sponsor ---
-    lead_key = clean_company_name(lead_raw)
-    if lead_key in unique_cleaned_map:
-        matched.add(unique_cleaned_map[lead_key])
-
-    # --- If no lead match, try collaborators ---
-    if not matched:
-        for collab_raw in collab_list:
-            collab_key = clean_company_name(collab_raw)
-            if collab_key in unique_cleaned_map:
-                matched.add(unique_cleaned_map[collab_key])
-                break
-
-    # --- Record matched trials or unknowns ---
-    if matched:
-        for company in matched:
-            entry = known_companies.setdefault(company, {"trial_count": 0, "trials": []})
-            entry["trial_count"] += 1
-            entry["trials"].append(trial)
-    else:
-        unknown_trials.append(trial)
-
-    # --- Track the raw lead/collab pairing for reporting ---
-    if not collab_list or not any(bp in c.lower() for c in collab_list for bp in banned_phrases):
-        lead_sponsors.add((lead_raw, ", ".join(collab_list)))
-
-# -----------------------------------------------------------------------------
-# Write out the results
-# -----------------------------------------------------------------------------
-with open("output/known_companies.json", "w") as f:
-    json.dump(known_companies, f, indent=2)
-
-with open("output/unknown_trials.json", "w") as f:
-    json.dump(unknown_trials, f, indent=2)
-
-with open("output/lead_sponsors.txt", "w") as f:
-    for i, (lead, collab_str) in enumerate(sorted(lead_sponsors), 1):
-        f.write(f"{i}. {lead} | {collab_str}\n")
-
-# Final summary
-total_matched = sum(v["trial_count"] for v in known_companies.values())
-print(f"Identified trials: {total_matched}")
-print(f"Unknown trials: {len(unknown_trials)}")
-print(f"Number of known companies: {len(known_companies)}")
-print(f"Number of unknown company names: {len(company_names) - len(known_companies)}")
\ No newline at end of file
+def main():
+    # -------------------------------------------------------------------------
+    # Setup: make sure output directory exists
+    # -------------------------------------------------------------------------
+    os.makedirs("output", exist_ok=True)
+
+    print(f"Banned phrases: {banned_phrases}")
+    print(f"Business suffixes: {business_suffixes}")
+
+    # -------------------------------------------------------------------------
+    # Read in the raw company names from your CSV
+    # -------------------------------------------------------------------------
+    company_names = []
+    with open("resources/unique_company_names.csv", "r") as f:
+        next(f)  # skip header
+        for line in f:
+            name = line.strip().strip('"')
+            if name:
+                company_names.append(name)
+
+    # -------------------------------------------------------------------------
+    # Build a temporary map from cleaned key → list of raw names
+    # This lets us detect collisions (multiple raw names mapping to same key)
+    # -------------------------------------------------------------------------
+    # Cleaning is pure CPU work per name, so it is spread across processes
+    with ProcessPoolExecutor() as executor:
+        keys = list(executor.map(clean_company_name, company_names, chunksize=2048))
+
+    temp_map = defaultdict(list)
+    for raw, key in zip(company_names, keys):
+        if key:  # skip empty keys
+            temp_map[key].append(raw)
+
+    # -------------------------------------------------------------------------
+    # Build final mapping of unique cleaned key → single raw name
+    # (only keep keys that map to exactly one raw name)
+    # -------------------------------------------------------------------------
+    unique_cleaned_map = {
+        key: originals[0]
+        for key, originals in temp_map.items()
+        if len(originals) == 1
+    }
+
+    # Save that cleaned → raw mapping for reference
+    with open("output/cleaned_company_names.json", "wb") as f:
+        f.write(orjson.dumps(unique_cleaned_map))
+
+    # Prepare containers for matched companies and unknown trials
+    known_companies = {}   # cleaned_key → { trial_count, trials: [...] }
+    unknown_trials = []    # trials we couldn’t match to any company
+    lead_sponsors = set()  # to record unique (lead, collaborators) pairs
+
+    # -------------------------------------------------------------------------
+    # Iterate through each trial, try to match lead sponsor or collaborators.
+    # Trials are parsed one line at a time. Every trial that isn't banned is
+    # still kept (under a company or in unknown_trials), so this mostly saves
+    # parsing the whole file up front rather than much memory.
+    # -------------------------------------------------------------------------
+    try:
+        with open("output/all_clinical_trials.jsonl", 'rb') as trials_file:
+            for line in trials_file:
+                if not line.strip():
+                    continue
+                trial = orjson.loads(line)
+                lead_raw = trial.get("Lead Sponsor", "").strip()
+                collab_list = [
+                    c.strip() for c in trial.get("Collaborators", "").split(",") if c.strip()
+                ]
+
+                # Skip trial entirely if lead contains a banned phrase
+                if has_banned(lead_raw):
+                    continue
+
+                matched = set()
+
+                # --- Attempt to match the lead sponsor ---
+                lead_key = clean_company_name(lead_raw)
+                if lead_key in unique_cleaned_map:
+                    matched.add(unique_cleaned_map[lead_key])
+
+                # --- If no lead match, try collaborators ---
+                if not matched:
+                    for collab_raw in collab_list:
+                        collab_key = clean_company_name(collab_raw)
+                        if collab_key in unique_cleaned_map:
+                            matched.add(unique_cleaned_map[collab_key])
+                            break
+
+                # --- Record matched trials or unknowns ---
+                if matched:
+                    for company in matched:
+                        entry = known_companies.setdefault(company, {"trial_count": 0, "trials": []})
+                        entry["trial_count"] += 1
+                        entry["trials"].append(trial)
+                else:
+                    unknown_trials.append(trial)
+
+                # --- Track the raw lead/collab pairing for reporting ---
+                if not any(has_banned(c) for c in collab_list):
+                    lead_sponsors.add((lead_raw, ", ".join(collab_list)))
+    except (OSError, orjson.JSONDecodeError) as e:
+        print(f"Error loading JSON file: {e}")
+        exit(1)
+
+    # -------------------------------------------------------------------------
+    # Write out the results
+    # -------------------------------------------------------------------------
+    with open("output/known_companies.json", "wb") as f:
+        f.write(orjson.dumps(known_companies))
+
+    with open("output/unknown_trials.json", "wb") as f:
+        f.write(orjson.dumps(unknown_trials))
+
+    with open("output/lead_sponsors.txt", "w") as f:
+        for i, (lead, collab_str) in enumerate(sorted(lead_sponsors), 1):
+            f.write(f"{i}. {lead} | {collab_str}\n")
+
+    # Final summary
+    total_matched = sum(v["trial_count"] for v in known_companies.values())
+    print(f"Identified trials: {total_matched}")
+    print(f"Unknown trials: {len(unknown_trials)}")
+    print(f"Number of known companies: {len(known_companies)}")
+    print(f"Number of unknown company names: {len(company_names) - len(known_companies)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import json
+import os
+import orjson
+import logging
+import numpy as np
 import pandas as pd
 import datetime
 import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 
 from app.services.bing_search import search_bing
@@ -24,76 +29,74 @@ TARGET_ELEMENTS = [
     "descriptions-item__value--activeOrg"
 ]
 
+logger = logging.getLogger(__name__)
+
+# Maximum number of drug pages looked up concurrently (network-bound)
+MAX_SCRAPE_WORKERS = 8
+
+# (column label, tag looked for in the space-stripped, upper-cased phase string)
+_PHASE_PATTERNS = (("Phase 1", "PHASE1"), ("Phase 2", "PHASE2"), ("Phase 3", "PHASE3"))
+
+# Characters stripped from a drug name before it is used as a cache key
+_NON_WORD_RE = re.compile(r"[^\w\-]")
+
+# A comma-separated item with at least one non-blank character
+_LIST_ITEM_PATTERN = r"[^,]*[^,\s][^,]*"
+
 # ---- Helper functions for one-hot encoding and processing ----
+# Each helper works on a whole column at once so encoding runs in pandas'
+# vectorized string methods rather than per trial in Python.
 
-def one_hot_phases(phases: str) -> Dict[str, int]:
+def one_hot_phases(phases: pd.Series) -> pd.DataFrame:
     """
     One-hot encode phase information. If multiple phases are listed (e.g., "PHASE1, PHASE2"),
-    both get a 1.
-    """
-    print(f"\n[DEBUG] Encoding phases: {phases}")
-    phases = phases.upper().replace(" ", "")
-    mapping = {"Phase 1": 0, "Phase 2": 0, "Phase 3": 0}
-    if "PHASE1" in phases:
-        mapping["Phase 1"] = 1
-    if "PHASE2" in phases:
-        mapping["Phase 2"] = 1
-    if "PHASE3" in phases:
-        mapping["Phase 3"] = 1
-    print(f"[DEBUG] Phase encoding result: {mapping}")
-    return mapping
-
-def one_hot_study_type(study_type: str) -> Dict[str, int]:
+    both get a 1. Returns one int8 column per phase.
+    """
+    phases = phases.fillna("").str.upper().str.replace(" ", "", regex=False)
+    return pd.DataFrame({
+        label: phases.str.contains(tag, regex=False).astype(np.int8)
+        for label, tag in _PHASE_PATTERNS
+    })
+
+def one_hot_study_type(study_type: pd.Series) -> pd.DataFrame:
     """
     One-hot encode study type into 'Interventional' or 'Observational'.
+    Anything not clearly observational is treated as interventional.
+    """
+    stype = study_type.fillna("").str.lower()
+    observational = (
+        stype.str.contains("observat", regex=False)
+        & ~stype.str.contains("intervention", regex=False)
+    )
+    return pd.DataFrame({
+        "Interventional": (~observational).astype(np.int8),
+        "Observational": observational.astype(np.int8),
+    })
+
+def arms_count(arms: pd.Series) -> pd.Series:
+    """
+    Split the arms string by comma and count the number of non-blank arms.
     """
-    print(f"\n[DEBUG] Encoding study type: {study_type}")
-    mapping = {"Interventional": 0, "Observational": 0}
-    stype = study_type.lower()
-    if "intervention" in stype:
-        mapping["Interventional"] = 1
-    elif "observat" in stype:
-        mapping["Observational"] = 1
-    else:
-        mapping["Interventional"] = 1
-    print(f"[DEBUG] Study type encoding result: {mapping}")
-    return mapping
-
-def arms_count(arms: str) -> int:
-    """
-    Split the arms string by comma and count the number of arms.
-    """
-    print(f"\n[DEBUG] Counting arms: {arms}")
-    if arms:
-        count = len([arm.strip() for arm in arms.split(",") if arm.strip()])
-        print(f"[DEBUG] Found {count} arms")
-        return count
-    print("[DEBUG] No arms found")
-    return 0
-
-def one_hot_bool(value: bool) -> int:
-    result = 1 if value else 0
-    print(f"[DEBUG] Boolean encoding: {value} -> {result}")
-    return result
-
-def count_collaborators(collaborators: str) -> int:
+    return arms.fillna("").str.count(_LIST_ITEM_PATTERN)
+
+def one_hot_bool(values: pd.Series) -> pd.Series:
+    return values.astype(bool).astype(np.int8)
+
+def count_collaborators(collaborators: pd.Series) -> pd.Series:
     """
     Count the number of collaborators by splitting the string on commas.
-    Returns 0 if collaborators is None or empty.
+    Returns 0 where collaborators is None or empty.
     """
-    if not collaborators:
-        return 0
-    collaborator_list = [c.strip() for c in collaborators.split(",") if c.strip()]
-    return len(collaborator_list)
+    return collaborators.fillna("").str.count(_LIST_ITEM_PATTERN)
 
 def scrape_drug_info(drug_name: str) -> Dict[str, str]:
     """
     Scrape drug information from PatSnap using Bing search, with caching.
     """
-    print(f"\n[DEBUG] Scraping drug info for: {drug_name}")
+    logger.debug("Scraping drug info for: %s", drug_name)
     
     # Clean the drug name for caching
-    clean_name = re.sub(r"[^\w\-]", "", drug_name.split()[0].split(",")[0])
+    clean_name = _NON_WORD_RE.sub("", drug_name.split()[0].split(",")[0])
     
     # Check cache first
     cached_info = get_cached_drug_info(clean_name)
@@ -103,92 +106,143 @@ def scrape_drug_info(drug_name: str) -> Dict[str, str]:
     # Search PatSnap via Bing
     domain = "synapse.patsnap.com"
     results = search_bing(drug_name, domain)
-    print(f"[DEBUG] Bing search results: {results}")
+    logger.debug("Bing search results: %s", results)
     
     # Look for the first Synapse drug page
     for page in results.get('webPages', {}).get('value', []):
         url = page.get('url', '')
         if 'synapse.patsnap.com/drug' in url:
-            print(f"[DEBUG] Found drug page URL: {url}")
+            logger.debug("Found drug page URL: %s", url)
             content = scrape_and_parse_webpage(url, TARGET_ELEMENTS, clean_name)
-            print(f"[DEBUG] Extracted content: {content}")
+            logger.debug("Extracted content: %s", content)
             return content
 
-    print("[DEBUG] No drug page found")
+    logger.debug("No drug page found")
     return {}
 
+def trial_drug_key(trial: Dict[str, Any]) -> str:
+    """
+    Cleaned name of the trial's first intervention, as used for the drug cache.
+    """
+    drug_name = trial.get("Interventions", "")
+    if not drug_name:
+        return ""
+    return _NON_WORD_RE.sub("", drug_name.split()[0].split(",")[0])
+
+def lookup_trial_drug(trial: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Scrape (or fetch from cache) the drug information for a single trial.
+    """
+    cleaned = trial_drug_key(trial)
+    if not cleaned:
+        return {}
+    return scrape_drug_info(f"{cleaned} {trial.get('NCT ID', '')}")
+
+def lookup_drug_group(trials: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Look up the drug shared by a group of trials. Later trials reuse the first
+    non-empty result, and only search again (with their own NCT ID) while
+    nothing has been found yet.
+    """
+    infos = []
+    info = {}
+    for trial in trials:
+        if not info:
+            info = lookup_trial_drug(trial)
+        infos.append(info)
+    return infos
+
 def process_company(company_name: str, trials: List[Dict[str, Any]]) -> pd.DataFrame:
     """
     Process all trials for a single company and return a DataFrame.
     """
-    print(f"\n[DEBUG] Processing company: {company_name} ({len(trials)} trials)")
-    rows = []
-    
-    for i, trial in enumerate(trials, start=1):
-        drug_name = trial.get("Interventions", "")
-        trial_id  = trial.get("NCT ID", "")
-        print(f"[DEBUG] Trial {i}: {drug_name} ({trial_id})")
-        
-        # Scrape or fetch from cache
-        if drug_name:
-            cleaned = re.sub(r"[^\w\-]", "", drug_name.split()[0].split(",")[0])
-            drug_info = scrape_drug_info(f"{cleaned} {trial_id}")
-        else:
-            drug_info = {}
-        
-        # Encodings and counts
-        study_enc = one_hot_study_type(trial.get("Study Type", ""))
-        phase_enc = one_hot_phases(trial.get("Phases", ""))
-        arm_num   = arms_count(trial.get("Arms", ""))
-
-        # Build output row
-        row = {
-            "nct_id": trial_id,
-            "company_name": company_name,
-            "drug_name": drug_name,
-            **{key.split("--")[-1]: drug_info.get(key, "") for key in TARGET_ELEMENTS},
-            "study_type_interventional": study_enc["Interventional"],
-            "study_type_observational":  study_enc["Observational"],
-            "phase": phase_enc,
-            "arms_count": arm_num,
-            "number_of_sites": trial.get("Number of Sites"),
-            "enrollment": trial.get("Enrollment"),
-            "overall_status": trial.get("Overall Status", ""),
-            "failed?": trial.get("Failed?", False),
-            "accepts_healthy_volunteers": one_hot_bool(trial.get("Accepts Healthy Volunteers", False)),
-            "number_of_collaborators": count_collaborators(trial.get("Collaborators", "")),
-            # ... include any additional trial fields you need ...
-        }
-        rows.append(row)
-        print(f"[DEBUG] Finished trial {i}")
-
-    df = pd.DataFrame(rows)
-    print(f"[DEBUG] Built DataFrame: {df.shape} rows")
+    logger.debug("Processing company: %s (%s trials)", company_name, len(trials))
+    n = len(trials)
+
+    # Group trials by drug so each distinct drug is searched once, then scrape
+    # (or fetch from cache) the groups concurrently to overlap network waits
+    groups = defaultdict(list)  # cleaned drug name -> trial indices
+    for i, trial in enumerate(trials):
+        groups[trial_drug_key(trial)].append(i)
+    logger.debug("%s distinct drugs across %s trials", len(groups), n)
+
+    drug_infos = [None] * n
+    with ThreadPoolExecutor(max_workers=MAX_SCRAPE_WORKERS) as executor:
+        group_infos = executor.map(
+            lambda indices: lookup_drug_group([trials[i] for i in indices]),
+            groups.values()
+        )
+        for indices, infos in zip(groups.values(), group_infos):
+            for i, info in zip(indices, infos):
+                drug_infos[i] = info
+
+    # Raw trial fields, one column each; the encodings below then run over
+    # whole columns instead of trial by trial
+    raw = pd.DataFrame({
+        "study_type": [trial.get("Study Type", "") for trial in trials],
+        "phases": [trial.get("Phases", "") for trial in trials],
+        "arms": [trial.get("Arms", "") for trial in trials],
+        "healthy_volunteers": [trial.get("Accepts Healthy Volunteers", False) for trial in trials],
+        "collaborators": [trial.get("Collaborators", "") for trial in trials],
+    }, dtype=object)
+    study_enc = one_hot_study_type(raw["study_type"])
+    phase_enc = one_hot_phases(raw["phases"])
+
+    df = pd.DataFrame({
+        "nct_id": [trial.get("NCT ID", "") for trial in trials],
+        "company_name": [company_name] * n,
+        "drug_name": [trial.get("Interventions", "") for trial in trials],
+        **{
+            key.split("--")[-1]: [drug_info.get(key, "") for drug_info in drug_infos]
+            for key in TARGET_ELEMENTS
+        },
+        "study_type_interventional": study_enc["Interventional"],
+        "study_type_observational": study_enc["Observational"],
+        "phase": phase_enc.to_dict("records"),
+        "arms_count": arms_count(raw["arms"]),
+        "number_of_sites": [trial.get("Number of Sites") for trial in trials],
+        "enrollment": [trial.get("Enrollment") for trial in trials],
+        "overall_status": [trial.get("Overall Status", "") for trial in trials],
+        "failed?": [trial.get("Failed?", False) for trial in trials],
+        "accepts_healthy_volunteers": one_hot_bool(raw["healthy_volunteers"]),
+        "number_of_collaborators": count_collaborators(raw["collaborators"]),
+        # ... include any additional trial fields you need ...
+    })
+    logger.debug("Built DataFrame: %s rows", df.shape)
     return df
 
 if __name__ == "__main__":
-    print("\n[DEBUG] Starting main script")
+    # Per-trial detail is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info("Starting main script")
     
     # Load companies JSON
-    with open("output/known_companies.json") as f:
-        companies_data = json.load(f)
-    print(f"[DEBUG] Found {len(companies_data)} companies")
+    with open("output/known_companies.json", "rb") as f:
+        companies_data = orjson.loads(f.read())
+    logger.info("Found %s companies", len(companies_data))
 
-    # Prepare or load master CSV
+    # Append to the master CSV, writing the header only when starting fresh
     out_csv = "output/all_trials.csv"
     try:
-        all_df = pd.read_csv(out_csv)
-        print(f"[DEBUG] Loaded existing CSV ({all_df.shape[0]} rows)")
-    except FileNotFoundError:
-        all_df = pd.DataFrame()
-        print("[DEBUG] No existing CSV, creating new one")
-
-    # Process each company
+        total_rows = pd.read_csv(out_csv, usecols=[0]).shape[0]
+        write_header = False
+        logger.info("Appending to existing CSV (%s rows)", total_rows)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        total_rows = 0
+        write_header = True
+        logger.info("No existing CSV, creating new one")
+
+    # Process each company, appending only its own rows instead of rewriting
+    # the whole accumulated table after every company
     for company, info in companies_data.items():
         trials = info.get("trials", [])
         comp_df = process_company(company, trials)
-        all_df = pd.concat([all_df, comp_df], ignore_index=True)
-        all_df.to_csv(out_csv, index=False)
-        print(f"[DEBUG] Saved {comp_df.shape[0]} trials for {company}")
-
-    print(f"[DEBUG] Completed. Total trials: {all_df.shape[0]}")
\ No newline at end of file
+        if comp_df.empty:
+            logger.info("Saved 0 trials for %s", company)
+            continue
+        comp_df.to_csv(out_csv, mode="w" if write_header else "a", header=write_header, index=False)
+        write_header = False
+        total_rows += comp_df.shape[0]
+        logger.info("Saved %s trials for %s", comp_df.shape[0], company)
+
+    logger.info("Completed. Total trials: %s", total_rows)
\ No newline at end of file
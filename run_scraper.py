@@ -1,133 +1,169 @@
 import requests
-import json
+import orjson
 import sys
 import os 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from app.http_session import make_session
 
 API_URL = "https://clinicaltrials.gov/api/v2/studies"
 OUTPUT_FOLDER = "output"
-OUTPUT_FILE = "all_clinical_trials.json"
+OUTPUT_FILE = "all_clinical_trials.jsonl"  # one trial per line
 PAGE_SIZE = 1000  # maximum trials per request
 FAILED_STATUSES = {"TERMINATED", "SUSPENDED", "WITHDRAWN"}
+_EMPTY = {}  # shared read-only default for missing modules; never mutate
+
+# Keep-alive session so consecutive pages reuse the same TLS connection
+_session = make_session()
 
 def safe_join(iterable, sep=", "):
     # Convert items to strings and skip None values.
-    return sep.join(str(item) for item in iterable if item is not None)
+    return sep.join([str(item) for item in iterable if item is not None])
+
+def fetch_page(page_token: Optional[str] = None, page_size: int = PAGE_SIZE) -> dict:
+    params = {
+        "format": "json",
+        "pageSize": page_size,
+    }
+    if page_token:
+        params["pageToken"] = page_token
 
-def fetch_all_trials(page_size: int = PAGE_SIZE) -> list:
-    all_trials = []
+    response = _session.get(API_URL, params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def fetch_all_trials(page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    # Yields trials page by page so callers can write them out as they arrive
+    # instead of holding the whole registry in memory.
+    # Page tokens chain, so pages can't be requested in parallel; instead the
+    # next page is fetched in the background while the current one is parsed.
     page_token = None  # initial request has no pageToken
 
-    while True:
-        params = {
-            "format": "json",
-            "pageSize": page_size,
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        pending = prefetcher.submit(fetch_page, page_token, page_size)
+        while pending is not None:
+            data = pending.result()
+
+            studies = data.get("studies", [])
+            if not studies:
+                break
+
+            next_token = data.get("nextPageToken")
+            pending = prefetcher.submit(fetch_page, next_token, page_size) if next_token else None
+
+            yield from parse_studies(studies)
+
+            print(f"Fetched {len(studies)} trials. Next page token: {page_token}")
+            page_token = next_token
+
+def parse_studies(studies: list) -> Iterator[dict]:
+    for study in studies:
+        ps = study.get("protocolSection") or _EMPTY
+        id_mod = ps.get("identificationModule") or _EMPTY
+        status_mod = ps.get("statusModule") or _EMPTY
+        sponsor_mod = ps.get("sponsorCollaboratorsModule") or _EMPTY
+        desc_mod = ps.get("descriptionModule") or _EMPTY
+        cond_mod = ps.get("conditionsModule") or _EMPTY
+        arms_mod = ps.get("armsInterventionsModule") or _EMPTY
+        design_mod = ps.get("designModule") or _EMPTY
+        design_info = design_mod.get("designInfo") or _EMPTY
+        outcomes_mod = ps.get("outcomesModule") or _EMPTY
+        elig_mod = ps.get("eligibilityModule") or _EMPTY
+        loc_mod = ps.get("contactsLocationsModule") or _EMPTY
+        locations = loc_mod.get("locations") or ()
+        oversight_mod = ps.get("oversightModule") or _EMPTY
+        adverse_mod = ps.get("adverseEventsModule") or _EMPTY
+        doc_mod = ps.get("documentSection") or _EMPTY
+        ipd_mod = ps.get("ipdSharingStatementModule") or _EMPTY
+        # returned to the caller as-is, so it gets its own dict rather than the shared sentinel
+        baseline_mod = ps.get("baselineCharacteristicsModule", {})
+        overall_status = status_mod.get("overallStatus")
+
+        trial = {
+            "NCT ID": id_mod.get("nctId"),
+            "Official Title": id_mod.get("officialTitle"),
+            "Lead Sponsor": (sponsor_mod.get("leadSponsor") or _EMPTY).get("name"),
+            "Collaborators": safe_join([c.get("name") for c in sponsor_mod.get("collaborators") or ()]),
+            "Overall Status": overall_status,
+            "Failed?": overall_status in FAILED_STATUSES,
+            "Brief Summary": desc_mod.get("briefSummary"),
+            "Detailed Description": desc_mod.get("detailedDescription"),
+            "Conditions": safe_join(cond_mod.get("conditions") or ()),
+            "Interventions": safe_join([i.get("name") for i in arms_mod.get("interventions") or ()]),
+            "Enrollment": (design_mod.get("enrollmentInfo") or _EMPTY).get("count"),
+            "Primary Outcomes": safe_join([o.get("measure") for o in outcomes_mod.get("primaryOutcomes") or ()]),
+            "Secondary Outcomes": safe_join([o.get("measure") for o in outcomes_mod.get("secondaryOutcomes") or ()]),
+            "Min Age": elig_mod.get("minimumAge"),
+            "Max Age": elig_mod.get("maximumAge"),
+            "Sex Eligibility": elig_mod.get("sex"),
+            "Accepts Healthy Volunteers": elig_mod.get("healthyVolunteers"),
+            "Start Date": (status_mod.get("startDateStruct") or _EMPTY).get("date"),
+            "Primary Completion Date": (status_mod.get("primaryCompletionDateStruct") or _EMPTY).get("date"),
+            "Last Update Date": (status_mod.get("lastUpdatePostDateStruct") or _EMPTY).get("date"),
+            "Study Type": design_mod.get("studyType"),
+            "Phases": safe_join(design_mod.get("phases") or ()),
+            "Locations": safe_join([
+                f"{loc.get('city') or ''}, {loc.get('country') or ''}"
+                for loc in locations
+                if loc.get("city") or loc.get("country")
+            ]),
+            # Additional hyperparameters
+            "Randomization": design_info.get("allocation"),
+            "Masking": (design_info.get("maskingInfo") or _EMPTY).get("masking"),
+            "Intervention Model": design_info.get("interventionModel"),
+            "Primary Purpose": design_info.get("primaryPurpose"),
+            "Arms": safe_join([ag.get("label") for ag in arms_mod.get("armGroups") or ()]),
+            "Adverse Events Summary": {
+                "Serious Events": adverse_mod.get("seriousEvents"),
+                "Other Events": adverse_mod.get("otherEvents"),
+            },
+            "Number of Sites": len(locations),
+            "FDA Regulated Drug": oversight_mod.get("isFdaRegulatedDrug"),
+            "FDA Regulated Device": oversight_mod.get("isFdaRegulatedDevice"),
+            "DSMB Present": oversight_mod.get("oversightHasDmc"),
+            "Expanded Access": (status_mod.get("expandedAccessInfo") or _EMPTY).get("hasExpandedAccess"),
+            "IPD Sharing": ipd_mod.get("ipdSharing"),
+            "Protocol Documents": safe_join([
+                doc.get("filename") for doc in (doc_mod.get("largeDocumentModule") or _EMPTY).get("largeDocs") or ()
+            ]),
+            "Study First Submit Date": status_mod.get("studyFirstSubmitDate"),
+            "Study First Post Date": (status_mod.get("studyFirstPostDateStruct") or _EMPTY).get("date"),
+            "Results First Submit Date": status_mod.get("resultsFirstSubmitDate"),
+            "Results First Post Date": (status_mod.get("resultsFirstPostDateStruct") or _EMPTY).get("date"),
+            "Baseline Characteristics": baseline_mod  # raw capture of baseline demographics info
         }
-        if page_token:
-            params["pageToken"] = page_token
-
-        response = requests.get(API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        studies = data.get("studies", [])
-        if not studies:
-            break
-
-        for study in studies:
-            ps = study.get("protocolSection", {})
-            id_mod = ps.get("identificationModule", {})
-            status_mod = ps.get("statusModule", {})
-            sponsor_mod = ps.get("sponsorCollaboratorsModule", {})
-            design_mod = ps.get("designModule", {})
-            outcomes_mod = ps.get("outcomesModule", {})
-            elig_mod = ps.get("eligibilityModule", {})
-            loc_mod = ps.get("contactsLocationsModule", {})
-            oversight_mod = ps.get("oversightModule", {})
-            adverse_mod = ps.get("adverseEventsModule", {})
-            doc_mod = ps.get("documentSection", {})
-            ipd_mod = ps.get("ipdSharingStatementModule", {})
-            baseline_mod = ps.get("baselineCharacteristicsModule", {})
-
-            trial = {
-                "NCT ID": id_mod.get("nctId"),
-                "Official Title": id_mod.get("officialTitle"),
-                "Lead Sponsor": sponsor_mod.get("leadSponsor", {}).get("name"),
-                "Collaborators": safe_join(c.get("name") for c in sponsor_mod.get("collaborators", [])),
-                "Overall Status": status_mod.get("overallStatus"),
-                "Failed?": status_mod.get("overallStatus") in FAILED_STATUSES,
-                "Brief Summary": ps.get("descriptionModule", {}).get("briefSummary"),
-                "Detailed Description": ps.get("descriptionModule", {}).get("detailedDescription"),
-                "Conditions": safe_join(ps.get("conditionsModule", {}).get("conditions", [])),
-                "Interventions": safe_join(i.get("name") for i in ps.get("armsInterventionsModule", {}).get("interventions", [])),
-                "Enrollment": design_mod.get("enrollmentInfo", {}).get("count"),
-                "Primary Outcomes": safe_join(o.get("measure") for o in outcomes_mod.get("primaryOutcomes", [])),
-                "Secondary Outcomes": safe_join(o.get("measure") for o in outcomes_mod.get("secondaryOutcomes", [])),
-                "Min Age": elig_mod.get("minimumAge"),
-                "Max Age": elig_mod.get("maximumAge"),
-                "Sex Eligibility": elig_mod.get("sex"),
-                "Accepts Healthy Volunteers": elig_mod.get("healthyVolunteers"),
-                "Start Date": status_mod.get("startDateStruct", {}).get("date"),
-                "Primary Completion Date": status_mod.get("primaryCompletionDateStruct", {}).get("date"),
-                "Last Update Date": status_mod.get("lastUpdatePostDateStruct", {}).get("date"),
-                "Study Type": design_mod.get("studyType"),
-                "Phases": safe_join(phase for phase in design_mod.get("phases", [])),
-                "Locations": safe_join(
-                    f"{loc.get('city') or ''}, {loc.get('country') or ''}"
-                    for loc in loc_mod.get("locations", [])
-                    if loc.get("city") or loc.get("country")
-                ),
-                # Additional hyperparameters
-                "Randomization": design_mod.get("designInfo", {}).get("allocation"),
-                "Masking": design_mod.get("designInfo", {}).get("maskingInfo", {}).get("masking"),
-                "Intervention Model": design_mod.get("designInfo", {}).get("interventionModel"),
-                "Primary Purpose": design_mod.get("designInfo", {}).get("primaryPurpose"),
-                "Arms": safe_join(ag.get("label") for ag in ps.get("armsInterventionsModule", {}).get("armGroups", [])),
-                "Adverse Events Summary": {
-                    "Serious Events": adverse_mod.get("seriousEvents"),
-                    "Other Events": adverse_mod.get("otherEvents"),
-                },
-                "Number of Sites": len(loc_mod.get("locations", [])),
-                "FDA Regulated Drug": oversight_mod.get("isFdaRegulatedDrug"),
-                "FDA Regulated Device": oversight_mod.get("isFdaRegulatedDevice"),
-                "DSMB Present": oversight_mod.get("oversightHasDmc"),
-                "Expanded Access": status_mod.get("expandedAccessInfo", {}).get("hasExpandedAccess"),
-                "IPD Sharing": ipd_mod.get("ipdSharing"),
-                "Protocol Documents": safe_join(
-                    doc.get("filename") for doc in doc_mod.get("largeDocumentModule", {}).get("largeDocs", [])
-                ),
-                "Study First Submit Date": status_mod.get("studyFirstSubmitDate"),
-                "Study First Post Date": status_mod.get("studyFirstPostDateStruct", {}).get("date"),
-                "Results First Submit Date": status_mod.get("resultsFirstSubmitDate"),
-                "Results First Post Date": status_mod.get("resultsFirstPostDateStruct", {}).get("date"),
-                "Baseline Characteristics": baseline_mod  # raw capture of baseline demographics info
-            }
-            all_trials.append(trial)
-
-        print(f"Fetched {len(studies)} trials. Next page token: {page_token}")
-        page_token = data.get("nextPageToken")
-        if not page_token:
-            break
-
-    return all_trials
+        yield trial
 
 def main():
+    tmp_path = None
     try:
         # create output folder 
-        if not os.path.exists(OUTPUT_FOLDER):
-            os.makedirs(OUTPUT_FOLDER)
+        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-        # fetch all trials
-        trials = fetch_all_trials()
+        # fetch all trials, streaming each one as JSON Lines into a temp file next
+        # to the output; it only replaces the previous dataset once every page has
+        # been fetched, so a failed run leaves the last complete file untouched
+        count = 0
         file_path = os.path.join(OUTPUT_FOLDER, OUTPUT_FILE)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(trials, f, indent=2)
-        print(f"Retrieved metadata for {len(trials)} trials → saved to '{OUTPUT_FILE}'")
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for trial in fetch_all_trials():
+                f.write(orjson.dumps(trial) + b"\n")
+                count += 1
+        os.replace(tmp_path, file_path)
+        tmp_path = None
+        print(f"Retrieved metadata for {count} trials → saved to '{OUTPUT_FILE}'")
     except requests.HTTPError as http_err:
         print(f"HTTP error: {http_err}", file=sys.stderr)
         sys.exit(1)
     except Exception as err:
         print(f"Unexpected error: {err}", file=sys.stderr)
         sys.exit(2)
+    finally:
+        # drop a partial download rather than leave it beside the real output
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file